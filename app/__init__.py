@@ -6,10 +6,54 @@ Application Package
 __version__ = "1.0.0"
 __author__ = "AI Engineering Team"
 
+import importlib
+
 from app.config import config
-from app.database import get_database_instance, initialize_database
-from app.llm import get_llm_instance, initialize_llm
-from app.agent import get_agent_instance, query_database, initialize_agent
+
+# Heavy submodules (LangChain, BigQuery, Vertex AI) are imported on first access
+_LAZY_EXPORTS = {
+    "get_database_instance": "app.database",
+    "initialize_database": "app.database",
+    "get_llm_instance": "app.llm",
+    "initialize_llm": "app.llm",
+    "get_agent_instance": "app.agent",
+    "query_database": "app.agent",
+    "stream_query_database": "app.agent",
+    "initialize_agent": "app.agent",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def _warm_up():
+    from concurrent.futures import ThreadPoolExecutor
+    from app.database import warmup_database
+    from app.llm import warmup_llm
+    from app.agent import initialize_agent
+    
+    # Database and LLM warm-ups are independent network round trips
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(warmup_database), executor.submit(warmup_llm)]
+        for future in futures:
+            future.result()
+    
+    initialize_agent()
+
+
+# Optionally warm the database, LLM and SQL agent in the background so
+# the first user query does not pay for initialization
+if config.EAGER_AGENT_INIT:
+    import threading
+    threading.Thread(
+        target=_warm_up, name="app-warmup", daemon=True
+    ).start()
 
 __all__ = [
     "config",
@@ -19,5 +63,6 @@ __all__ = [
     "initialize_llm",
     "get_agent_instance",
     "query_database",
+    "stream_query_database",
     "initialize_agent",
 ]
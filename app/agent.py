@@ -4,10 +4,15 @@ Creates and manages LangChain SQL agent for natural language querying
 """
 
 import logging
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterator, Iterable, Tuple
 from langchain_community.agent_toolkits import create_sql_agent, SQLDatabaseToolkit
-from langchain.agents import AgentExecutor, AgentType  # Add AgentType
+from langchain.agents import AgentExecutor, AgentType
 from langchain_core.messages import SystemMessage
+from langchain_core.tools import Tool
 from app.config import config
 from app.database import get_database_instance
 from app.llm import get_llm_instance
@@ -15,54 +20,100 @@ from app.llm import get_llm_instance
 logger = logging.getLogger(__name__)
 
 
-# System prompt for the SQL agent
-SQL_AGENT_SYSTEM_PROMPT = """You are an expert automotive sales analyst with deep knowledge of SQL and BigQuery.
-You help business users get insights from the automotive sales database by converting their natural language questions into SQL queries.
-
-Database Schema:
-The database contains 6 tables about automotive sales:
-1. **vehicles** - Vehicle inventory (vehicle_id, make, model, year, body_type, msrp)
-2. **dealerships** - Dealership locations (dealership_id, name, city, state)
-3. **customers** - Customer information (customer_id, first_name, registration_date)
-4. **sales_transactions** - Transaction records (transaction_id, vehicle_id, customer_id, dealership_id, sale_date, sale_price)
-5. **marketing_campaigns** - Marketing campaign data (campaign_id, campaign_name, start_date, end_date, budget)
-6. **competitor_sales** - Competitor sales data (record_id, competitor_make, sale_month, region, units_sold)
+# System prompt for the SQL agent (kept short: it is replayed on every ReAct step)
+SQL_AGENT_SYSTEM_PROMPT = """You are an expert automotive sales analyst who answers business questions by writing BigQuery SQL.
 
 CRITICAL - BigQuery SQL Syntax:
-- For year extraction: EXTRACT(YEAR FROM date_column) NOT strftime
-- For month extraction: EXTRACT(MONTH FROM date_column)
-- For date filtering: WHERE date_column >= '2024-01-01'
-- Table names already qualified, use them as-is
-- Use standard SQL syntax, NOT SQLite functions
+- Use EXTRACT(YEAR|MONTH FROM date_column), NOT strftime or other SQLite functions
+- Compare dates as 'YYYY-MM-DD' strings, e.g. WHERE sale_date >= '2024-01-01'
+- Table names are already qualified, use them as-is
 
 Guidelines:
-- Always start by understanding what tables contain the data needed
-- Use table descriptions to understand the schema before writing queries
-- For time-based queries, use EXTRACT() function for date parts
-- When calculating metrics, use appropriate aggregations (SUM, AVG, COUNT)
-- For top/bottom queries, use ORDER BY with LIMIT
-- Join tables appropriately using foreign keys
-- Return clean, formatted results
-- If a query might return many rows, limit results to top {top_k}
-- Always explain your reasoning before executing queries
-- If you're unsure about the data, query the schema first
+- Call get_schema_reference for table/column overview and data notes before writing queries
+- Call get_sample_rows only when you need example values from a specific table
+- Aggregate with SUM/AVG/COUNT, use ORDER BY + LIMIT for top/bottom, join on foreign keys
+- Limit potentially large results to top {top_k}
+- Explain your reasoning briefly and provide insights along with the data
+"""
+
+# Schema reference served on demand through the get_schema_reference tool
+SQL_SCHEMA_REFERENCE = """The database contains 6 tables about automotive sales:
+1. vehicles - Vehicle inventory (vehicle_id, make, model, year, body_type, msrp)
+2. dealerships - Dealership locations (dealership_id, name, city, state)
+3. customers - Customer information (customer_id, first_name, registration_date)
+4. sales_transactions - Transaction records (transaction_id, vehicle_id, customer_id, dealership_id, sale_date, sale_price)
+5. marketing_campaigns - Marketing campaign data (campaign_id, campaign_name, start_date, end_date, budget)
+6. competitor_sales - Competitor sales data (record_id, competitor_make, sale_month, region, units_sold)
 
 Data Notes:
 - Date range: January 2023 - October 2024
 - sale_price is the final transaction price (may be below MSRP due to discounts)
 - All monetary values are in USD
-- Use DATE format 'YYYY-MM-DD' for date comparisons
-
-Be helpful, accurate, and provide insights along with the data!
 """
 
+# Output AgentExecutor returns when max_iterations or max_execution_time cuts a run short
+_AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+# SQLDatabaseToolkit tools whose input is a SQL statement
+_SQL_QUERY_TOOL_NAMES = frozenset({"sql_db_query", "sql_db_query_checker"})
+
+_SCHEMA_TOOL = Tool(
+    name="get_schema_reference",
+    func=lambda _: SQL_SCHEMA_REFERENCE,
+    description=(
+        "Input is an empty string, output is an overview of all tables, "
+        "their key columns and notes about the data. Use this first."
+    ),
+)
+
+_SAMPLE_ROWS_TOOL = Tool(
+    name="get_sample_rows",
+    func=lambda table_name: get_database_instance().get_sample_rows(table_name.strip()),
+    description=(
+        "Input is a single table name, output is a few example rows from "
+        "that table. Use this when you need to see actual column values."
+    ),
+)
+
+# Custom tools added to the SQLDatabaseToolkit tools
+_EXTRA_TOOLS = [_SCHEMA_TOOL, _SAMPLE_ROWS_TOOL]
+
+
+@lru_cache(maxsize=8)
+def _format_system_prompt(top_k: int) -> str:
+    """Format the system prompt once per distinct top_k value"""
+    return SQL_AGENT_SYSTEM_PROMPT.format(top_k=top_k)
+
+
+# Pre-formatted prompt for the configured top_k
+_FORMATTED_PROMPT = _format_system_prompt(config.SQL_TOP_K_RESULTS)
+
+
+def _normalize_question(question: str) -> str:
+    """Lowercase and collapse whitespace so equivalent questions share a cache key"""
+    return " ".join(question.lower().split())
+
 
 class SQLAgentManager:
     """Manager for SQL Agent operations"""
     
+    __slots__ = (
+        "_agent",
+        "_toolkit",
+        "_toolkit_info_cache",
+        "_lock",
+        "_query_cache",
+        "_query_cache_lock",
+    )
+    
     def __init__(self):
         self._agent: Optional[AgentExecutor] = None
         self._toolkit: Optional[SQLDatabaseToolkit] = None
+        self._toolkit_info_cache: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        # Answers cached as normalized question -> (expiry, result), least recently used first
+        self._query_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
     
     def create_agent(self) -> AgentExecutor:
         """
@@ -71,99 +122,202 @@ class SQLAgentManager:
         Returns:
             AgentExecutor: Configured SQL agent
         """
-        if self._agent is None:
+        if self._agent is not None:
+            return self._agent
+        
+        # Serialize construction so concurrent cold queries build one toolkit
+        with self._lock:
+            if self._agent is None:
+                try:
+                    toolkit = self._ensure_toolkit()
+                    self._agent = self._build_executor(toolkit)
+                    
+                    logger.info("SQL agent created successfully")
+                    
+                except Exception as e:
+                    logger.error("Failed to create SQL agent: %s", e)
+                    raise
+        
+        return self._agent
+    
+    def _ensure_toolkit(self) -> SQLDatabaseToolkit:
+        """
+        Get or create the SQL Database Toolkit
+        
+        The toolkit is kept across agent rebuilds so a failed executor
+        build does not repeat schema reflection.
+        
+        Returns:
+            SQLDatabaseToolkit: Toolkit bound to the database and LLM
+        """
+        if self._toolkit is None:
+            # Get database and LLM
+            db_instance = get_database_instance()
+            llm_manager = get_llm_instance()
+            
+            db = db_instance.get_database()
+            llm = llm_manager.get_llm()
+            
+            # Warm the schema cache the toolkit's tools read, so the agent's
+            # first schema lookups don't wait on sample row queries
             try:
-                # Get database and LLM
-                db_instance = get_database_instance()
-                llm_manager = get_llm_instance()
-                
-                db = db_instance.get_database()
-                llm = llm_manager.get_llm()
-                
-                logger.info("Creating SQL agent toolkit...")
-                
-                # Create SQL Database Toolkit
-                self._toolkit = SQLDatabaseToolkit(
-                    db=db,
-                    llm=llm,
-                )
-                
-                logger.info("Creating SQL agent with Gemini 2.0 compatibility...")
-                
-                # Use ZERO_SHOT_REACT_DESCRIPTION for Gemini 2.0 compatibility
-                from langchain.agents import AgentType
-                
-                self._agent = create_sql_agent(
-                    llm=llm,
-                    toolkit=self._toolkit,
-                    agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-                    verbose=True,
-                    max_iterations=config.SQL_AGENT_MAX_ITERATIONS,
-                    max_execution_time=config.SQL_AGENT_MAX_EXECUTION_TIME,
-                    handle_parsing_errors=True,
-                    agent_executor_kwargs={
-                        "return_intermediate_steps": True,
-                    },
-                    prefix=SQL_AGENT_SYSTEM_PROMPT.format(
-                        top_k=config.SQL_TOP_K_RESULTS
-                    ),
-                )
-                
-                logger.info("SQL agent created successfully")
-                
+                db_instance.prefetch_table_info()
             except Exception as e:
-                logger.error(f"Failed to create SQL agent: {str(e)}")
-                raise
+                logger.warning("Schema prefetch failed: %s", e)
+            
+            logger.info("Creating SQL agent toolkit...")
+            
+            self._toolkit = SQLDatabaseToolkit(
+                db=db,
+                llm=llm,
+            )
         
-        return self._agent
+        return self._toolkit
+    
+    def _build_executor(self, toolkit: SQLDatabaseToolkit) -> AgentExecutor:
+        """
+        Build the agent executor on top of an existing toolkit
+        
+        Args:
+            toolkit: SQL Database Toolkit to build the agent from
+            
+        Returns:
+            AgentExecutor: Configured SQL agent
+        """
+        logger.info("Creating SQL agent with Gemini 2.0 compatibility...")
+        
+        # Use ZERO_SHOT_REACT_DESCRIPTION for Gemini 2.0 compatibility
+        return create_sql_agent(
+            llm=toolkit.llm,
+            toolkit=toolkit,
+            agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+            verbose=config.DEBUG,
+            max_iterations=config.SQL_AGENT_MAX_ITERATIONS,
+            max_execution_time=config.SQL_AGENT_MAX_EXECUTION_TIME,
+            handle_parsing_errors=True,
+            prefix=_FORMATTED_PROMPT,
+            extra_tools=_EXTRA_TOOLS,
+        )
     
-    def query(self, question: str) -> Dict[str, Any]:
+    def query(self, question: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         Execute a natural language query using the SQL agent
         
         Args:
             question: Natural language question
+            use_cache: Serve a cached answer if one exists (a fresh answer is cached either way)
             
         Returns:
             dict: Query results with output and metadata
         """
+        cache_key = _normalize_question(question)
+        cached = self._get_cached_result(cache_key) if use_cache else None
+        if cached is not None:
+            logger.info("Serving cached result for query: %s", question)
+            return {**cached, "question": question}
+        
         try:
-            agent = self.create_agent()
-            
-            logger.info(f"Processing query: {question}")
-            
-            # Execute agent
-            result = agent.invoke({"input": question})
-            
-            # Extract output
-            output = result.get("output", "No response generated")
-            intermediate_steps = result.get("intermediate_steps", [])
-            
-            # Extract SQL queries from intermediate steps
-            sql_queries = []
-            for step in intermediate_steps:
-                if len(step) >= 2:
-                    action, observation = step[0], step[1]
-                    if hasattr(action, 'tool') and 'sql' in action.tool.lower():
-                        if hasattr(action, 'tool_input'):
-                            sql_queries.append(action.tool_input)
-            
-            return {
-                "status": "success",
-                "question": question,
-                "answer": output,
-                "sql_queries": sql_queries,
-                "steps_count": len(intermediate_steps),
-            }
+            logger.info("Processing query: %s", question)
+            response = self._build_response(question, self.stream_query(question))
+            self._store_cached_result(cache_key, response)
+            return response
             
         except Exception as e:
-            logger.error(f"Query execution failed: {str(e)}")
+            logger.error("Query execution failed: %s", e)
             return {
                 "status": "error",
                 "question": question,
                 "error": str(e),
             }
     
+    @staticmethod
+    def _build_response(question: str, events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Consume agent events, keeping only actions and the answer"""
+        output = "No response generated"
+        sql_queries = []
+        steps_count = 0
+        for event in events:
+            event_type = event["type"]
+            if event_type == "action":
+                steps_count += 1
+                tool_input = event["tool_input"]
+                if event["tool"] in _SQL_QUERY_TOOL_NAMES and tool_input is not None:
+                    sql_queries.append(tool_input)
+            elif event_type == "answer":
+                output = event["answer"] or output
+        
+        return {
+            "status": "success",
+            "question": question,
+            "answer": output,
+            "sql_queries": sql_queries,
+            "steps_count": steps_count,
+            # Runs cut short by the agent limits may succeed on a later attempt
+            "stopped": output == _AGENT_STOPPED_OUTPUT,
+        }
+    
+    def stream_query(self, question: str) -> Iterator[Dict[str, Any]]:
+        """
+        Execute a natural language query, yielding agent progress as it happens
+        
+        Args:
+            question: Natural language question
+            
+        Yields:
+            dict: Event with a "type" of "action" (tool, tool_input),
+                "observation" (tool, observation) or "answer" (answer)
+        """
+        agent = self._agent or self.create_agent()
+        
+        for chunk in agent.stream({"input": question}):
+            yield from self._chunk_events(chunk)
+    
+    @staticmethod
+    def _chunk_events(chunk: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Translate an AgentExecutor stream chunk into agent events"""
+        for action in chunk.get("actions", ()):
+            yield {
+                "type": "action",
+                "tool": action.tool,
+                "tool_input": action.tool_input,
+            }
+        for step in chunk.get("steps", ()):
+            yield {
+                "type": "observation",
+                "tool": step.action.tool,
+                "observation": step.observation,
+            }
+        if "output" in chunk:
+            yield {
+                "type": "answer",
+                "answer": chunk["output"],
+            }
+    
+    def _get_cached_result(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached successful result for a normalized question if it hasn't expired"""
+        with self._query_cache_lock:
+            entry = self._query_cache.get(key)
+            if entry is None:
+                return None
+            expiry, result = entry
+            if time.monotonic() >= expiry:
+                del self._query_cache[key]
+                return None
+            self._query_cache.move_to_end(key)
+            return result
+    
+    def _store_cached_result(self, key: str, result: Dict[str, Any]) -> None:
+        """Cache a completed result for QUERY_CACHE_TTL_SECONDS, evicting the least recently used entry"""
+        if config.QUERY_CACHE_SIZE <= 0 or config.QUERY_CACHE_TTL_SECONDS <= 0:
+            return
+        if result.get("stopped"):
+            return
+        with self._query_cache_lock:
+            self._query_cache[key] = (time.monotonic() + config.QUERY_CACHE_TTL_SECONDS, result)
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > config.QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+    
     def get_toolkit_info(self) -> Dict[str, Any]:
         """
         Get information about available tools
@@ -171,13 +325,17 @@ class SQLAgentManager:
         Returns:
             dict: Toolkit information
         """
+        if self._toolkit_info_cache is not None:
+            return self._toolkit_info_cache
+        
         try:
             if self._toolkit is None:
                 self.create_agent()
             
-            tools = self._toolkit.get_tools()
+            tools = self._toolkit.get_tools() + _EXTRA_TOOLS
             
-            return {
+            # Tool descriptions don't change over the agent's lifetime
+            self._toolkit_info_cache = {
                 "status": "success",
                 "tool_count": len(tools),
                 "tools": [
@@ -188,16 +346,26 @@ class SQLAgentManager:
                     for tool in tools
                 ],
             }
+            return self._toolkit_info_cache
         except Exception as e:
-            logger.error(f"Failed to get toolkit info: {str(e)}")
+            logger.error("Failed to get toolkit info: %s", e)
             return {
                 "status": "error",
                 "error": str(e),
             }
+    
+    def reset(self):
+        """Discard the agent, toolkit and cached toolkit info"""
+        self._agent = None
+        self._toolkit = None
+        self._toolkit_info_cache = None
+        with self._query_cache_lock:
+            self._query_cache.clear()
 
 
 # Global agent instance
 _agent_instance: Optional[SQLAgentManager] = None
+_agent_lock = threading.Lock()
 
 
 def get_agent_instance() -> SQLAgentManager:
@@ -208,23 +376,43 @@ def get_agent_instance() -> SQLAgentManager:
         SQLAgentManager: Agent manager instance
     """
     global _agent_instance
-    if _agent_instance is None:
-        _agent_instance = SQLAgentManager()
-    return _agent_instance
+    instance = _agent_instance
+    if instance is not None:
+        return instance
+    
+    with _agent_lock:
+        if _agent_instance is None:
+            _agent_instance = SQLAgentManager()
+        return _agent_instance
 
 
-def query_database(question: str) -> Dict[str, Any]:
+def query_database(question: str, use_cache: bool = True) -> Dict[str, Any]:
     """
     Convenience function to query database with natural language
     
     Args:
         question: Natural language question
+        use_cache: Serve a cached answer if one exists
         
     Returns:
         dict: Query results
     """
     agent_manager = get_agent_instance()
-    return agent_manager.query(question)
+    return agent_manager.query(question, use_cache=use_cache)
+
+
+def stream_query_database(question: str) -> Iterator[Dict[str, Any]]:
+    """
+    Convenience function to stream agent progress for a natural language query
+    
+    Args:
+        question: Natural language question
+        
+    Yields:
+        dict: Agent events (see SQLAgentManager.stream_query)
+    """
+    agent_manager = get_agent_instance()
+    yield from agent_manager.stream_query(question)
 
 
 def initialize_agent() -> dict:
@@ -245,7 +433,7 @@ def initialize_agent() -> dict:
             "tools_available": toolkit_info.get("tool_count", 0),
         }
     except Exception as e:
-        logger.error(f"Agent initialization failed: {str(e)}")
+        logger.error("Agent initialization failed: %s", e)
         return {
             "status": "error",
             "error": str(e),
@@ -0,0 +1,18 @@
+"""
+Chat Module
+Data structures for the chat history kept in Streamlit session state
+"""
+
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass(slots=True)
+class ChatMessage:
+    """A single chat turn kept in session state"""
+    role: str
+    content: str
+    ts: float
+    sql_queries: Tuple[str, ...] = ()
+    steps_count: int = 0
+    error: bool = False
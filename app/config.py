@@ -2,55 +2,107 @@
 # All sensitive values should be set via environment variables
 
 import os
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 from dotenv import load_dotenv 
 
 # Load environment variables from .env file
 load_dotenv()  # ADD THIS LINE
 
+# Environment parsing helpers - invalid values fail with the offending variable name
+_ENV = os.environ
+
+
+def _env_str(key: str, default: str) -> str:
+    return _ENV.get(key, default)
+
+
+def _env_int(key: str, default: str) -> int:
+    value = _ENV.get(key, default)
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {key} must be an integer, got {value!r}") from None
+
+
+def _env_float(key: str, default: str) -> float:
+    value = _ENV.get(key, default)
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {key} must be a number, got {value!r}") from None
+
+
+def _env_bool(key: str, default: str) -> bool:
+    return _ENV.get(key, default).lower() == "true"
+
+
 class Config:
     """Application configuration"""
     
     # Google Cloud Project Configuration
-    PROJECT_ID: str = os.getenv("GCP_PROJECT_ID", "YOUR_PROJECT_ID")
-    LOCATION: str = os.getenv("GCP_LOCATION", "us-central1")
+    PROJECT_ID: str = _env_str("GCP_PROJECT_ID", "YOUR_PROJECT_ID")
+    LOCATION: str = _env_str("GCP_LOCATION", "us-central1")
     
     # BigQuery Configuration
-    BIGQUERY_DATASET: str = os.getenv("BIGQUERY_DATASET", "automotive_data")
-    BIGQUERY_LOCATION: str = os.getenv("BIGQUERY_LOCATION", "US")
+    BIGQUERY_DATASET: str = _env_str("BIGQUERY_DATASET", "automotive_data")
+    BIGQUERY_LOCATION: str = _env_str("BIGQUERY_LOCATION", "US")
+    
+    # Connection Pool Configuration
+    # SERVERLESS=true disables pooling (NullPool) for short-lived runtimes
+    SERVERLESS: bool = _env_bool("SERVERLESS", "false")
+    DB_POOL_SIZE: int = _env_int("DB_POOL_SIZE", "5")
+    DB_MAX_OVERFLOW: int = _env_int("DB_MAX_OVERFLOW", "10")
+    DB_POOL_RECYCLE: int = _env_int("DB_POOL_RECYCLE", "1800")
     
     # Vertex AI Configuration
-    GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-lite-001")
-    GEMINI_TEMPERATURE: float = float(os.getenv("GEMINI_TEMPERATURE", "0.1"))
-    GEMINI_MAX_OUTPUT_TOKENS: int = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "2048"))
-    GEMINI_TOP_P: float = float(os.getenv("GEMINI_TOP_P", "0.95"))
-    GEMINI_TOP_K: int = int(os.getenv("GEMINI_TOP_K", "40"))
+    GEMINI_MODEL: str = _env_str("GEMINI_MODEL", "gemini-2.0-flash-lite-001")
+    GEMINI_TEMPERATURE: float = _env_float("GEMINI_TEMPERATURE", "0.1")
+    GEMINI_MAX_OUTPUT_TOKENS: int = _env_int("GEMINI_MAX_OUTPUT_TOKENS", "2048")
+    GEMINI_TOP_P: float = _env_float("GEMINI_TOP_P", "0.95")
+    GEMINI_TOP_K: int = _env_int("GEMINI_TOP_K", "40")
     
     # Authentication
     # For local development: set GOOGLE_APPLICATION_CREDENTIALS
     # For Cloud Run: uses default service account
-    GOOGLE_APPLICATION_CREDENTIALS: Optional[str] = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    GOOGLE_APPLICATION_CREDENTIALS: Optional[str] = _ENV.get("GOOGLE_APPLICATION_CREDENTIALS")
     
     # Application Configuration
     APP_TITLE: str = "Automotive Sales Analytics Chatbot"
     APP_ICON: str = "🚗"
-    MAX_CHAT_HISTORY: int = int(os.getenv("MAX_CHAT_HISTORY", "10"))
+    MAX_CHAT_HISTORY: int = _env_int("MAX_CHAT_HISTORY", "10")
     
     # LangChain Configuration
-    LANGCHAIN_TRACING_V2: bool = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
-    LANGCHAIN_API_KEY: Optional[str] = os.getenv("LANGCHAIN_API_KEY")
-    LANGCHAIN_PROJECT: Optional[str] = os.getenv("LANGCHAIN_PROJECT")
+    LANGCHAIN_TRACING_V2: bool = _env_bool("LANGCHAIN_TRACING_V2", "false")
+    LANGCHAIN_API_KEY: Optional[str] = _ENV.get("LANGCHAIN_API_KEY")
+    LANGCHAIN_PROJECT: Optional[str] = _ENV.get("LANGCHAIN_PROJECT")
     
     # SQL Agent Configuration
-    SQL_AGENT_MAX_ITERATIONS: int = int(os.getenv("SQL_AGENT_MAX_ITERATIONS", "15"))
-    SQL_AGENT_MAX_EXECUTION_TIME: int = int(os.getenv("SQL_AGENT_MAX_EXECUTION_TIME", "100"))
-    SQL_TOP_K_RESULTS: int = int(os.getenv("SQL_TOP_K_RESULTS", "10"))
+    SQL_AGENT_MAX_ITERATIONS: int = _env_int("SQL_AGENT_MAX_ITERATIONS", "8")
+    SQL_AGENT_MAX_EXECUTION_TIME: int = _env_int("SQL_AGENT_MAX_EXECUTION_TIME", "100")
+    SQL_TOP_K_RESULTS: int = _env_int("SQL_TOP_K_RESULTS", "10")
+    # Sample rows included in every schema lookup (0 = fetch on demand only)
+    SQL_SAMPLE_ROWS_IN_TABLE_INFO: int = _env_int("SQL_SAMPLE_ROWS_IN_TABLE_INFO", "0")
+    # Longest string value returned per column in query results
+    SQL_MAX_STRING_LENGTH: int = _env_int("SQL_MAX_STRING_LENGTH", "256")
+    EAGER_AGENT_INIT: bool = _env_str("EAGER_AGENT_INIT", "0") == "1"
+    
+    # Caching Configuration
+    # LLM_CACHE_PATH: SQLite file for LLM response caching (opt-in; empty disables it).
+    # Entries persist across restarts and are never evicted or bypassed by fresh queries
+    LLM_CACHE_PATH: str = _env_str("LLM_CACHE_PATH", "")
+    QUERY_CACHE_SIZE: int = _env_int("QUERY_CACHE_SIZE", "256")
+    # Answers reflect live data, so cached ones expire
+    QUERY_CACHE_TTL_SECONDS: int = _env_int("QUERY_CACHE_TTL_SECONDS", "600")
+    SCHEMA_CACHE_TTL_SECONDS: int = _env_int("SCHEMA_CACHE_TTL_SECONDS", "300")
     
     # Logging
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVEL: str = _env_str("LOG_LEVEL", "INFO")
+    # DEBUG=true makes LangChain print prompts and responses (verbose mode)
+    DEBUG: bool = _env_bool("DEBUG", "false")
     
     # Session Configuration
-    SESSION_TIMEOUT_MINUTES: int = int(os.getenv("SESSION_TIMEOUT_MINUTES", "30"))
+    SESSION_TIMEOUT_MINUTES: int = _env_int("SESSION_TIMEOUT_MINUTES", "30")
     
     @classmethod
     def validate(cls) -> None:
@@ -72,21 +124,26 @@ class Config:
             )
     
     @classmethod
+    @lru_cache(maxsize=None)
     def get_bigquery_uri(cls) -> str:
         """Get the BigQuery connection URI"""
         return f"bigquery://{cls.PROJECT_ID}/{cls.BIGQUERY_DATASET}"
     
     @classmethod
-    def display_config(cls) -> dict:
-        """Get configuration for display (without sensitive data)"""
-        return {
-            "Project ID": cls.PROJECT_ID,
-            "Location": cls.LOCATION,
-            "Dataset": cls.BIGQUERY_DATASET,
-            "Model": cls.GEMINI_MODEL,
-            "Temperature": cls.GEMINI_TEMPERATURE,
-        }
+    @lru_cache(maxsize=1)
+    def display_config(cls) -> Tuple[Tuple[str, str], ...]:
+        """Get configuration for display (without sensitive data) as (label, value) pairs"""
+        return (
+            ("Project ID", str(cls.PROJECT_ID)),
+            ("Location", str(cls.LOCATION)),
+            ("Dataset", str(cls.BIGQUERY_DATASET)),
+            ("Model", str(cls.GEMINI_MODEL)),
+            ("Temperature", str(cls.GEMINI_TEMPERATURE)),
+        )
 
 
 # Initialize and validate config on import
+# Set SKIP_CONFIG_VALIDATE=1 to import without a complete configuration (e.g. tests)
 config = Config()
+if _ENV.get("SKIP_CONFIG_VALIDATE") != "1":
+    config.validate()
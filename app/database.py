@@ -4,75 +4,252 @@ Handles connection to Google Cloud BigQuery and provides database utilities
 """
 
 import logging
-from typing import Optional, List
-from google.cloud import bigquery
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Iterable, List, Dict, Tuple, Any
 from langchain_community.utilities import SQLDatabase
-from sqlalchemy import create_engine, pool
+from sqlalchemy import create_engine, literal_column, pool, select, text, Table
+from sqlalchemy import table as sql_table
 from app.config import config
 
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
 logger = logging.getLogger(__name__)
 
+# Maximum number of schema lookups kept in ParallelSQLDatabase's cache
+_SCHEMA_CACHE_SIZE = 128
+
+
+class ParallelSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase that caches schema lookups and fetches sample rows for
+    multiple tables concurrently
+    
+    The cache lives here rather than on BigQueryDatabase because this is the
+    object handed to SQLDatabaseToolkit, so the agent's schema tools hit it too.
+    Parallel sampling only comes into play when sample_rows_in_table_info is
+    enabled; with it set to 0 schema info is built exactly as SQLDatabase does.
+    """
+    
+    def __init__(self, *args, max_sample_workers: int = 8, schema_cache_ttl: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._max_sample_workers = max_sample_workers
+        self._prefetched = threading.local()
+        self._schema_cache_ttl = schema_cache_ttl
+        # Schema lookups cached as key -> (expiry, value), least recently used first
+        self._schema_cache: "OrderedDict[Tuple[str, ...], Tuple[float, Any]]" = OrderedDict()
+        self._schema_cache_lock = threading.Lock()
+    
+    def get_usable_table_names(self) -> Iterable[str]:
+        """Get names of tables available, cached for schema_cache_ttl seconds"""
+        cache_key = ("__table_names__",)
+        cached = self.get_cached_schema(cache_key)
+        if cached is None:
+            cached = tuple(super().get_usable_table_names())
+            self.cache_schema(cache_key, cached)
+        return list(cached)
+    
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        """Get table schema information, cached for schema_cache_ttl seconds"""
+        cache_key = ("__table_info__",) + (
+            tuple(sorted(table_names)) if table_names is not None else ("*",)
+        )
+        cached = self.get_cached_schema(cache_key)
+        if cached is None:
+            cached = self._load_table_info(table_names)
+            self.cache_schema(cache_key, cached)
+        return cached
+    
+    def get_cached_schema(self, key: Tuple[str, ...]) -> Optional[Any]:
+        """Return a cached schema lookup if it hasn't expired"""
+        with self._schema_cache_lock:
+            entry = self._schema_cache.get(key)
+            if entry is None:
+                return None
+            expiry, value = entry
+            if time.monotonic() >= expiry:
+                del self._schema_cache[key]
+                return None
+            self._schema_cache.move_to_end(key)
+            return value
+    
+    def cache_schema(self, key: Tuple[str, ...], value: Any) -> None:
+        """Cache a schema lookup for schema_cache_ttl seconds, evicting the least recently used"""
+        if self._schema_cache_ttl <= 0:
+            return
+        with self._schema_cache_lock:
+            self._schema_cache[key] = (time.monotonic() + self._schema_cache_ttl, value)
+            self._schema_cache.move_to_end(key)
+            while len(self._schema_cache) > _SCHEMA_CACHE_SIZE:
+                self._schema_cache.popitem(last=False)
+    
+    def invalidate_schema_cache(self) -> None:
+        """Drop cached schema lookups"""
+        with self._schema_cache_lock:
+            self._schema_cache.clear()
+    
+    def _load_table_info(self, table_names: Optional[List[str]]) -> str:
+        """
+        Build table schema information, issuing the per-table sample row
+        queries in parallel instead of one after another
+        
+        Only differs from SQLDatabase when sample_rows_in_table_info is
+        enabled; otherwise there are no per-table queries to parallelize.
+        """
+        if not self._sample_rows_in_table_info:
+            return super().get_table_info(table_names)
+        
+        usable = set(self.get_usable_table_names())
+        if table_names is not None:
+            # Reject unknown tables before issuing any sample queries
+            missing = set(table_names) - usable
+            if missing:
+                raise ValueError(f"table_names {missing} not found in database")
+            usable = set(table_names)
+        
+        # Tables with custom info are rendered verbatim and never sampled
+        custom_info = self._custom_table_info or {}
+        tables = [
+            table for table in self._metadata.sorted_tables
+            if table.name in usable and table.name not in custom_info
+        ]
+        # Tables sampled recently are served from the cache by _get_sample_rows
+        tables = [
+            table for table in tables
+            if self.get_cached_schema(("__table_samples__", table.name)) is None
+        ]
+        if len(tables) < 2:
+            return super().get_table_info(table_names)
+        
+        with ThreadPoolExecutor(max_workers=min(self._max_sample_workers, len(tables))) as executor:
+            samples = executor.map(self._fetch_sample_rows, tables)
+            self._prefetched.sample_rows = dict(zip((table.name for table in tables), samples))
+        
+        try:
+            return super().get_table_info(table_names)
+        finally:
+            self._prefetched.sample_rows = None
+    
+    def _get_sample_rows(self, table: Table) -> str:
+        sample_rows = getattr(self._prefetched, "sample_rows", None)
+        if sample_rows and table.name in sample_rows:
+            return sample_rows[table.name]
+        return self._fetch_sample_rows(table)
+    
+    def _fetch_sample_rows(self, table: Table) -> str:
+        """Sample rows for one table, cached so any later combination of tables reuses them"""
+        cache_key = ("__table_samples__", table.name)
+        cached = self.get_cached_schema(cache_key)
+        if cached is None:
+            cached = super()._get_sample_rows(table)
+            self.cache_schema(cache_key, cached)
+        return cached
+    
+    def prefetch_table_info(self) -> Dict[str, str]:
+        """
+        Warm the schema cache with per-table schema information
+        
+        The full schema lookup runs first so sample rows for every table are
+        fetched in parallel; the per-table lookups after it are then built
+        from cached samples without further queries.
+        
+        Returns:
+            Dict[str, str]: Table name to schema information
+        """
+        self.get_table_info()
+        return {table: self.get_table_info([table]) for table in self.get_usable_table_names()}
+
 
 class BigQueryDatabase:
     """Wrapper for BigQuery database connection"""
     
     def __init__(self):
-        self._db: Optional[SQLDatabase] = None
-        self._client: Optional[bigquery.Client] = None
+        self._db: Optional[ParallelSQLDatabase] = None
+        self._client: Optional["bigquery.Client"] = None
         self._connection_uri = config.get_bigquery_uri()
+        self._lock = threading.Lock()
     
-    def get_database(self) -> SQLDatabase:
+    def get_database(self) -> ParallelSQLDatabase:
         """
         Get or create SQLDatabase connection to BigQuery
         
         Returns:
-            SQLDatabase: LangChain SQLDatabase instance
+            ParallelSQLDatabase: LangChain SQLDatabase instance with schema caching
         """
-        if self._db is None:
-            try:
-                logger.info(f"Connecting to BigQuery: {config.BIGQUERY_DATASET}")
-                
-                # Create SQLAlchemy engine for BigQuery
-                # Using NullPool to avoid connection pooling issues with BigQuery
-                engine = create_engine(
-                    self._connection_uri,
-                    poolclass=pool.NullPool,
-                    echo=False,
-                )
-                
-                # Create LangChain SQLDatabase
-                # Don't use schema parameter - it causes BigQuery session variable errors
-                self._db = SQLDatabase(
-                    engine=engine,
-                    sample_rows_in_table_info=3,
-                    max_string_length=1000,
-                )
-                
-                logger.info("Successfully connected to BigQuery")
-                
-            except Exception as e:
-                logger.error(f"Failed to connect to BigQuery: {str(e)}")
-                raise
+        if self._db is not None:
+            return self._db
+        
+        # Serialize creation so concurrent callers share one engine
+        with self._lock:
+            if self._db is None:
+                try:
+                    logger.info("Connecting to BigQuery: %s", config.BIGQUERY_DATASET)
+                    
+                    # Create SQLAlchemy engine for BigQuery
+                    # Pool connections so each query doesn't pay connect/auth again;
+                    # serverless deployments keep NullPool since the process is short-lived
+                    if config.SERVERLESS:
+                        pool_kwargs = {"poolclass": pool.NullPool}
+                    else:
+                        pool_kwargs = {
+                            "pool_size": config.DB_POOL_SIZE,
+                            "max_overflow": config.DB_MAX_OVERFLOW,
+                            "pool_recycle": config.DB_POOL_RECYCLE,
+                            "pool_pre_ping": False,
+                        }
+                    
+                    engine = create_engine(
+                        self._connection_uri,
+                        echo=False,
+                        **pool_kwargs,
+                    )
+                    
+                    # Create LangChain SQLDatabase
+                    # Don't use schema parameter - it causes BigQuery session variable errors
+                    self._db = ParallelSQLDatabase(
+                        engine=engine,
+                        # Sample rows are fetched on demand via get_sample_rows
+                        sample_rows_in_table_info=config.SQL_SAMPLE_ROWS_IN_TABLE_INFO,
+                        max_string_length=config.SQL_MAX_STRING_LENGTH,
+                        schema_cache_ttl=config.SCHEMA_CACHE_TTL_SECONDS,
+                    )
+                    
+                    logger.info("Successfully connected to BigQuery")
+                    
+                except Exception as e:
+                    logger.error("Failed to connect to BigQuery: %s", e)
+                    raise
         
         return self._db
     
-    def get_client(self) -> bigquery.Client:
+    def get_client(self) -> "bigquery.Client":
         """
         Get BigQuery client for direct queries
         
         Returns:
             bigquery.Client: Google Cloud BigQuery client
         """
-        if self._client is None:
-            try:
-                self._client = bigquery.Client(
-                    project=config.PROJECT_ID,
-                    location=config.BIGQUERY_LOCATION,
-                )
-                logger.info("BigQuery client initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize BigQuery client: {str(e)}")
-                raise
+        if self._client is not None:
+            return self._client
+        
+        # Serialize creation so concurrent callers share one client
+        with self._lock:
+            if self._client is None:
+                try:
+                    # Imported here so processes that never need the client skip its import cost
+                    from google.cloud import bigquery
+                    
+                    self._client = bigquery.Client(
+                        project=config.PROJECT_ID,
+                        location=config.BIGQUERY_LOCATION,
+                    )
+                    logger.info("BigQuery client initialized")
+                except Exception as e:
+                    logger.error("Failed to initialize BigQuery client: %s", e)
+                    raise
         
         return self._client
     
@@ -85,9 +262,9 @@ class BigQueryDatabase:
         """
         try:
             db = self.get_database()
-            return db.get_usable_table_names()
+            return list(db.get_usable_table_names())
         except Exception as e:
-            logger.error(f"Failed to get table names: {str(e)}")
+            logger.error("Failed to get table names: %s", e)
             return []
     
     def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
@@ -104,9 +281,68 @@ class BigQueryDatabase:
             db = self.get_database()
             return db.get_table_info(table_names=table_names)
         except Exception as e:
-            logger.error(f"Failed to get table info: {str(e)}")
+            logger.error("Failed to get table info: %s", e)
             return f"Error retrieving table information: {str(e)}"
     
+    def get_sample_rows(self, table_name: str, limit: int = 3) -> str:
+        """
+        Get a few example rows from a single table
+        
+        Args:
+            table_name: Name of the table to sample
+            limit: Number of rows to return
+            
+        Returns:
+            str: Column names and sample rows, tab separated
+        """
+        cache_key = ("__sample_rows__", table_name, str(limit))
+        
+        try:
+            db = self.get_database()
+            cached = db.get_cached_schema(cache_key)
+            if cached is not None:
+                return cached
+            
+            if table_name not in db.get_usable_table_names():
+                return f"Error: table '{table_name}' not found"
+            
+            # Lightweight table clause; the dialect handles identifier quoting
+            query = select(literal_column("*")).select_from(sql_table(table_name)).limit(limit)
+            cursor = db.run(query, fetch="cursor")
+            columns = "\t".join(cursor.keys())
+            rows = cursor.fetchall()
+            
+            max_length = config.SQL_MAX_STRING_LENGTH
+            sample_rows = "\n".join(
+                "\t".join(str(value)[:max_length] for value in row) for row in rows
+            )
+            result = f"{len(rows)} rows from {table_name} table:\n{columns}\n{sample_rows}"
+            db.cache_schema(cache_key, result)
+            return result
+        except Exception as e:
+            logger.error("Failed to get sample rows for %s: %s", table_name, e)
+            return f"Error retrieving sample rows: {str(e)}"
+    
+    def invalidate_schema_cache(self) -> None:
+        """Drop cached schema information, e.g. after DDL changes"""
+        if self._db is not None:
+            self._db.invalidate_schema_cache()
+        logger.info("Schema cache invalidated")
+    
+    def prefetch_table_info(self) -> Dict[str, str]:
+        """
+        Warm the schema cache shared with the SQL agent's toolkit
+        
+        Entries expire with the rest of the schema cache, so later schema
+        changes are picked up.
+        
+        Returns:
+            Dict[str, str]: Table name to schema information
+        """
+        table_info = self.get_database().prefetch_table_info()
+        logger.info("Prefetched schema for %s tables", len(table_info))
+        return table_info
+    
     def run_query(self, query: str) -> str:
         """
         Execute a SQL query directly
@@ -122,7 +358,28 @@ class BigQueryDatabase:
             result = db.run(query)
             return result
         except Exception as e:
-            logger.error(f"Query execution failed: {str(e)}")
+            logger.error("Query execution failed: %s", e)
+            return f"Error executing query: {str(e)}"
+    
+    def run_parameterized(self, query: str, params: Dict[str, Any]) -> str:
+        """
+        Execute a SQL query with bound parameters
+        
+        Literals are sent as parameters rather than inlined, so repeated
+        query templates can be recognized and cached by the database.
+        
+        Args:
+            query: SQL query using :name placeholders
+            params: Values for the placeholders
+            
+        Returns:
+            str: Query results, formatted like run_query
+        """
+        try:
+            db = self.get_database()
+            return db.run(query, parameters=params)
+        except Exception as e:
+            logger.error("Parameterized query execution failed: %s", e)
             return f"Error executing query: {str(e)}"
     
     def test_connection(self) -> dict:
@@ -157,7 +414,7 @@ class BigQueryDatabase:
                     self._db._engine.dispose()
                 logger.info("Database connection closed")
             except Exception as e:
-                logger.warning(f"Error closing database connection: {str(e)}")
+                logger.warning("Error closing database connection: %s", e)
             finally:
                 self._db = None
         
@@ -166,13 +423,14 @@ class BigQueryDatabase:
                 self._client.close()
                 logger.info("BigQuery client closed")
             except Exception as e:
-                logger.warning(f"Error closing BigQuery client: {str(e)}")
+                logger.warning("Error closing BigQuery client: %s", e)
             finally:
                 self._client = None
 
 
 # Global database instance
 _db_instance: Optional[BigQueryDatabase] = None
+_db_lock = threading.Lock()
 
 
 def get_database_instance() -> BigQueryDatabase:
@@ -183,9 +441,14 @@ def get_database_instance() -> BigQueryDatabase:
         BigQueryDatabase: Database instance
     """
     global _db_instance
-    if _db_instance is None:
-        _db_instance = BigQueryDatabase()
-    return _db_instance
+    instance = _db_instance
+    if instance is not None:
+        return instance
+    
+    with _db_lock:
+        if _db_instance is None:
+            _db_instance = BigQueryDatabase()
+        return _db_instance
 
 
 def initialize_database() -> dict:
@@ -199,7 +462,35 @@ def initialize_database() -> dict:
         db_instance = get_database_instance()
         return db_instance.test_connection()
     except Exception as e:
-        logger.error(f"Database initialization failed: {str(e)}")
+        logger.error("Database initialization failed: %s", e)
+        return {
+            "status": "error",
+            "error": str(e),
+        }
+
+
+def warmup_database() -> dict:
+    """
+    Open the engine, ping BigQuery and prefetch schema ahead of the first request
+    
+    Returns:
+        dict: Warm-up status
+    """
+    try:
+        db_instance = get_database_instance()
+        db = db_instance.get_database()
+        
+        with db._engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        
+        table_info = db_instance.prefetch_table_info()
+        logger.info("Database warm-up complete")
+        return {
+            "status": "success",
+            "table_count": len(table_info),
+        }
+    except Exception as e:
+        logger.error("Database warm-up failed: %s", e)
         return {
             "status": "error",
             "error": str(e),
@@ -4,69 +4,119 @@ Handles language model initialization and configuration
 """
 
 import logging
-from typing import Optional
-import vertexai
-from vertexai.generative_models import GenerativeModel, GenerationConfig
-from langchain_google_vertexai import ChatVertexAI
+import threading
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Optional, Iterator, AsyncIterator, Mapping, Any, List
 from app.config import config
 
+if TYPE_CHECKING:
+    from langchain_google_vertexai import ChatVertexAI
+
 logger = logging.getLogger(__name__)
 
+# Generation parameters are fixed for the process lifetime; read-only so callers can't mutate it
+_GENERATION_CONFIG: Mapping[str, Any] = MappingProxyType({
+    "model": config.GEMINI_MODEL,
+    "temperature": config.GEMINI_TEMPERATURE,
+    "max_output_tokens": config.GEMINI_MAX_OUTPUT_TOKENS,
+    "top_p": config.GEMINI_TOP_P,
+    "top_k": config.GEMINI_TOP_K,
+})
+
+
+def _configure_llm_cache() -> None:
+    """Cache LLM responses so repeated prompts skip the model round trip"""
+    if config.LLM_CACHE_PATH:
+        from langchain_community.cache import SQLiteCache
+        from langchain_core.globals import set_llm_cache
+        set_llm_cache(SQLiteCache(database_path=config.LLM_CACHE_PATH))
+
 
 class LLMManager:
     """Manager for Language Model interactions"""
     
     def __init__(self):
-        self._llm: Optional[ChatVertexAI] = None
+        self._llm: Optional["ChatVertexAI"] = None
         self._initialized = False
+        # Re-entrant: get_llm() initializes Vertex AI while holding the lock
+        self._lock = threading.RLock()
     
     def initialize_vertex_ai(self) -> None:
         """Initialize Vertex AI with project configuration"""
-        if not self._initialized:
-            try:
-                vertexai.init(
-                    project=config.PROJECT_ID,
-                    location=config.LOCATION,
-                )
-                self._initialized = True
-                logger.info(
-                    f"Vertex AI initialized: {config.PROJECT_ID} ({config.LOCATION})"
-                )
-            except Exception as e:
-                logger.error(f"Failed to initialize Vertex AI: {str(e)}")
-                raise
+        if self._initialized:
+            return
+        
+        with self._lock:
+            if not self._initialized:
+                try:
+                    # Vertex AI SDK is imported on first use to keep module import cheap
+                    import vertexai
+                    from google.cloud.aiplatform import initializer
+                    
+                    # Skip re-init (and its credential check) if this process already
+                    # configured Vertex AI for the same project and location
+                    global_config = initializer.global_config
+                    if (
+                        getattr(global_config, "_project", None) == config.PROJECT_ID
+                        and getattr(global_config, "_location", None) == config.LOCATION
+                    ):
+                        self._initialized = True
+                        logger.info("Vertex AI already initialized: %s", config.PROJECT_ID)
+                        return
+                    
+                    vertexai.init(
+                        project=config.PROJECT_ID,
+                        location=config.LOCATION,
+                    )
+                    self._initialized = True
+                    logger.info(
+                        "Vertex AI initialized: %s (%s)", config.PROJECT_ID, config.LOCATION
+                    )
+                except Exception as e:
+                    logger.error("Failed to initialize Vertex AI: %s", e)
+                    raise
     
-    def get_llm(self) -> ChatVertexAI:
+    def get_llm(self) -> "ChatVertexAI":
         """
         Get or create LangChain ChatVertexAI instance for Gemini 2.0
         
         Returns:
             ChatVertexAI: Configured language model
         """
-        if self._llm is None:
-            try:
-                # Ensure Vertex AI is initialized
-                self.initialize_vertex_ai()
-                
-                # Create LangChain ChatVertexAI with Gemini 2.0
-                self._llm = ChatVertexAI(
-                    model_name=config.GEMINI_MODEL,
-                    temperature=config.GEMINI_TEMPERATURE,
-                    max_output_tokens=config.GEMINI_MAX_OUTPUT_TOKENS,
-                    top_p=config.GEMINI_TOP_P,
-                    top_k=config.GEMINI_TOP_K,
-                    project=config.PROJECT_ID,
-                    location=config.LOCATION,
-                    verbose=True,
-                    # Gemini 2.0 specific settings
-                    convert_system_message_to_human=False,  # Keep system messages
-                )
-                
-                logger.info(f"LLM initialized: {config.GEMINI_MODEL}")
-                
-            except Exception as e:
-                logger.error(f"Failed to initialize LLM: {str(e)}")
-                raise
+        if self._llm is not None:
+            return self._llm
+        
+        # Serialize creation so concurrent callers share one model client
+        with self._lock:
+            if self._llm is None:
+                try:
+                    # Ensure Vertex AI is initialized
+                    self.initialize_vertex_ai()
+                    _configure_llm_cache()
+                    
+                    from langchain_google_vertexai import ChatVertexAI
+                    
+                    # Create LangChain ChatVertexAI with Gemini 2.0
+                    self._llm = ChatVertexAI(
+                        model_name=config.GEMINI_MODEL,
+                        temperature=config.GEMINI_TEMPERATURE,
+                        max_output_tokens=config.GEMINI_MAX_OUTPUT_TOKENS,
+                        top_p=config.GEMINI_TOP_P,
+                        top_k=config.GEMINI_TOP_K,
+                        project=config.PROJECT_ID,
+                        location=config.LOCATION,
+                        verbose=config.DEBUG,
+                        # Stream tokens so callers get the first chunk early
+                        streaming=True,
+                        # Gemini 2.0 specific settings
+                        convert_system_message_to_human=False,  # Keep system messages
+                    )
+                    
+                    logger.info("LLM initialized: %s", config.GEMINI_MODEL)
+                    
+                except Exception as e:
+                    logger.error("Failed to initialize LLM: %s", e)
+                    raise
         
         return self._llm
     
@@ -84,33 +134,82 @@ class LLMManager:
             return {
                 "status": "success",
                 "model": config.GEMINI_MODEL,
-                "response": response.content if hasattr(response, 'content') else str(response),
+                "response": getattr(response, 'content', None) or str(response),
             }
         except Exception as e:
-            logger.error(f"LLM test failed: {str(e)}")
+            logger.error("LLM test failed: %s", e)
             return {
                 "status": "error",
                 "error": str(e),
             }
     
-    def get_generation_config(self) -> dict:
+    def invoke_batch(self, prompts: List[str], max_concurrency: int = 8) -> List[str]:
+        """
+        Run several independent prompts concurrently
+        
+        Args:
+            prompts: Prompt texts
+            max_concurrency: Maximum number of in-flight requests
+            
+        Returns:
+            List[str]: Response text for each prompt, in order
+        """
+        responses = self.get_llm().batch(prompts, config={"max_concurrency": max_concurrency})
+        return [getattr(response, 'content', None) or str(response) for response in responses]
+    
+    async def ainvoke_batch(self, prompts: List[str], max_concurrency: int = 8) -> List[str]:
+        """
+        Asynchronously run several independent prompts concurrently
+        
+        Args:
+            prompts: Prompt texts
+            max_concurrency: Maximum number of in-flight requests
+            
+        Returns:
+            List[str]: Response text for each prompt, in order
+        """
+        responses = await self.get_llm().abatch(prompts, config={"max_concurrency": max_concurrency})
+        return [getattr(response, 'content', None) or str(response) for response in responses]
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Stream the model response for a prompt
+        
+        Args:
+            prompt: Prompt text
+            
+        Yields:
+            str: Response text chunks as they arrive
+        """
+        for chunk in self.get_llm().stream(prompt):
+            yield chunk.content
+    
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Asynchronously stream the model response for a prompt
+        
+        Args:
+            prompt: Prompt text
+            
+        Yields:
+            str: Response text chunks as they arrive
+        """
+        async for chunk in self.get_llm().astream(prompt):
+            yield chunk.content
+    
+    def get_generation_config(self) -> Mapping[str, Any]:
         """
         Get current generation configuration
         
         Returns:
-            dict: Current configuration parameters
+            Mapping: Current configuration parameters (read-only)
         """
-        return {
-            "model": config.GEMINI_MODEL,
-            "temperature": config.GEMINI_TEMPERATURE,
-            "max_output_tokens": config.GEMINI_MAX_OUTPUT_TOKENS,
-            "top_p": config.GEMINI_TOP_P,
-            "top_k": config.GEMINI_TOP_K,
-        }
+        return _GENERATION_CONFIG
 
 
 # Global LLM instance
 _llm_instance: Optional[LLMManager] = None
+_llm_lock = threading.Lock()
 
 
 def get_llm_instance() -> LLMManager:
@@ -121,9 +220,14 @@ def get_llm_instance() -> LLMManager:
         LLMManager: LLM manager instance
     """
     global _llm_instance
-    if _llm_instance is None:
-        _llm_instance = LLMManager()
-    return _llm_instance
+    instance = _llm_instance
+    if instance is not None:
+        return instance
+    
+    with _llm_lock:
+        if _llm_instance is None:
+            _llm_instance = LLMManager()
+        return _llm_instance
 
 
 def initialize_llm() -> dict:
@@ -142,7 +246,30 @@ def initialize_llm() -> dict:
             "location": config.LOCATION,
         }
     except Exception as e:
-        logger.error(f"LLM initialization failed: {str(e)}")
+        logger.error("LLM initialization failed: %s", e)
+        return {
+            "status": "error",
+            "error": str(e),
+        }
+
+
+def warmup_llm() -> dict:
+    """
+    Initialize Vertex AI and send a ping prompt ahead of the first request
+    
+    Returns:
+        dict: Warm-up status
+    """
+    try:
+        llm = get_llm_instance().get_llm()
+        llm.invoke("ping")
+        logger.info("LLM warm-up complete")
+        return {
+            "status": "success",
+            "model": config.GEMINI_MODEL,
+        }
+    except Exception as e:
+        logger.error("LLM warm-up failed: %s", e)
         return {
             "status": "error",
             "error": str(e),
@@ -5,18 +5,22 @@ Main Streamlit Application
 
 import streamlit as st
 import logging
-from datetime import datetime
+import time
 from typing import List, Dict
 import sys
 
-# Add parent directory to path for module imports
+# Add parent directory to path for module imports when run as `streamlit run app/main.py`.
+# Streamlit re-executes this script on every rerun, so only insert it once
 import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT_DIR not in sys.path:
+    sys.path.insert(0, _ROOT_DIR)
 
 from app.config import config
+from app.chat import ChatMessage
 from app.database import initialize_database, get_database_instance
 from app.llm import initialize_llm
-from app.agent import query_database, initialize_agent
+from app.agent import query_database, initialize_agent, _normalize_question
 
 # Configure logging
 logging.basicConfig(
@@ -34,7 +38,7 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
+_CUSTOM_CSS = """
     <style>
     .main {
         padding: 1rem;
@@ -56,7 +60,49 @@ st.markdown("""
         margin: 0.5rem 0;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+# Sample questions offered in the sidebar, with their button labels
+_SAMPLE_QS = (
+    "What were total sales in California last quarter?",
+    "Which vehicle model sold the most in 2024?",
+    "Show me the top 5 dealerships by revenue",
+    "What's the average sale price by body type?",
+    "How many marketing campaigns ran in Q3 2023?",
+    "Compare our sales to Tesla in California",
+)
+_SAMPLE_LABELS = tuple(f"{i}. {q[:40]}..." for i, q in enumerate(_SAMPLE_QS, 1))
+
+# Welcome text shown while the chat is empty
+_WELCOME_MARKDOWN = f"""
+    ## Welcome to {config.APP_TITLE}! {config.APP_ICON}
+    
+    I'm your AI-powered automotive sales analyst. I can help you get insights from your sales data using natural language.
+    
+    ### What I can do:
+    - 📊 **Sales Analysis**: Revenue, units sold, trends over time
+    - 🚗 **Product Performance**: Best-selling models, body types, brands
+    - 🏪 **Dealership Insights**: Performance by location, state, region
+    - 👥 **Customer Analytics**: Registration trends, demographics
+    - 💰 **Marketing ROI**: Campaign performance, budget analysis
+    - 🎯 **Competitive Intelligence**: Market share, competitor analysis
+    
+    ### How to use:
+    1. Type your question in natural language
+    2. I'll convert it to SQL and query the database
+    3. Get instant insights with explanations
+    
+    **Try asking a question from the sidebar, or type your own!**
+    """
+
+# Number of most recent chat messages rendered before "Show earlier" is clicked
+_HISTORY_WINDOW = 20
+
+# Streamlit drops elements that a rerun does not re-emit, so the style block
+# must be sent every run; collapse its whitespace once to keep the message small
+_CUSTOM_CSS_MIN = " ".join(_CUSTOM_CSS.split())
+
+st.markdown(_CUSTOM_CSS_MIN, unsafe_allow_html=True)
 
 
 def initialize_session_state():
@@ -75,6 +121,34 @@ def initialize_session_state():
     
     if "agent_status" not in st.session_state:
         st.session_state.agent_status = None
+    
+    if "show_all_history" not in st.session_state:
+        st.session_state.show_all_history = False
+
+
+# Configuration values that identify the shared backend resources
+_RESOURCE_KEY = (
+    config.PROJECT_ID,
+    config.BIGQUERY_DATASET,
+    config.LOCATION,
+    config.GEMINI_MODEL,
+)
+
+
+# Heavy initializers are cached per server process and shared by all sessions
+@st.cache_resource(show_spinner=False, ttl=None)
+def _init_database(resource_key: tuple) -> dict:
+    return initialize_database()
+
+
+@st.cache_resource(show_spinner=False, ttl=None)
+def _init_llm(resource_key: tuple) -> dict:
+    return initialize_llm()
+
+
+@st.cache_resource(show_spinner=False, ttl=None)
+def _init_agent(resource_key: tuple) -> dict:
+    return initialize_agent()
 
 
 def initialize_system():
@@ -86,26 +160,32 @@ def initialize_system():
                 config.validate()
                 
                 # Initialize database
-                db_status = initialize_database()
+                db_status = _init_database(_RESOURCE_KEY)
                 st.session_state.db_status = db_status
                 
                 if db_status["status"] != "success":
+                    # Don't keep a failed initialization cached for other sessions
+                    _init_database.clear()
                     st.error(f"Database initialization failed: {db_status.get('error', 'Unknown error')}")
                     return False
                 
                 # Initialize LLM
-                llm_status = initialize_llm()
+                llm_status = _init_llm(_RESOURCE_KEY)
                 st.session_state.llm_status = llm_status
                 
                 if llm_status["status"] != "success":
+                    # Don't keep a failed initialization cached for other sessions
+                    _init_llm.clear()
                     st.error(f"LLM initialization failed: {llm_status.get('error', 'Unknown error')}")
                     return False
                 
                 # Initialize agent
-                agent_status = initialize_agent()
+                agent_status = _init_agent(_RESOURCE_KEY)
                 st.session_state.agent_status = agent_status
                 
                 if agent_status["status"] != "success":
+                    # Don't keep a failed initialization cached for other sessions
+                    _init_agent.clear()
                     st.error(f"Agent initialization failed: {agent_status.get('error', 'Unknown error')}")
                     return False
                 
@@ -148,71 +228,108 @@ def display_sidebar():
         
         # Configuration
         st.subheader("Configuration")
-        config_display = config.display_config()
-        for key, value in config_display.items():
+        for key, value in config.display_config():
             st.text(f"{key}: {value}")
         
         st.markdown("---")
         
         # Sample Questions
         st.subheader("💡 Sample Questions")
-        sample_questions = [
-            "What were total sales in California last quarter?",
-            "Which vehicle model sold the most in 2024?",
-            "Show me the top 5 dealerships by revenue",
-            "What's the average sale price by body type?",
-            "How many marketing campaigns ran in Q3 2023?",
-            "Compare our sales to Tesla in California",
-        ]
-        
-        for i, question in enumerate(sample_questions, 1):
-            if st.button(f"{i}. {question[:40]}...", key=f"sample_{i}", use_container_width=True):
-                st.session_state.messages.append({
-                    "role": "user",
-                    "content": question,
-                    "timestamp": datetime.now()
-                })
+        for i, (label, question) in enumerate(zip(_SAMPLE_LABELS, _SAMPLE_QS), 1):
+            if st.button(label, key=f"sample_{i}", use_container_width=True):
+                st.session_state.messages.append(
+                    ChatMessage(role="user", content=question, ts=time.time())
+                )
                 st.rerun()
         
         st.markdown("---")
         
+        # Cache control
+        st.checkbox(
+            "🔄 Fresh query",
+            key="fresh_query",
+            help="Run the next question against the database instead of reusing a cached answer",
+        )
+        
         # Clear Chat
         if st.button("🗑️ Clear Chat", use_container_width=True):
             st.session_state.messages = []
+            st.session_state.show_all_history = False
             st.rerun()
         
         st.markdown("---")
         st.caption(f"Version 1.0 | Built with Streamlit & Gemini")
 
 
-def display_welcome_message():
-    """Display welcome message when chat is empty"""
-    st.markdown(f"""
-    ## Welcome to {config.APP_TITLE}! {config.APP_ICON}
-    
-    I'm your AI-powered automotive sales analyst. I can help you get insights from your sales data using natural language.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_schema():
+    """Table names and schema DDL, cached across reruns and sessions"""
+    # Query the database directly so failures raise instead of caching an error string
+    db = get_database_instance().get_database()
+    return list(db.get_usable_table_names()), db.get_table_info()
+
+
+class _QueryFailed(Exception):
+    """Carries an error or stopped result out of _cached_query so it is not cached"""
     
-    ### What I can do:
-    - 📊 **Sales Analysis**: Revenue, units sold, trends over time
-    - 🚗 **Product Performance**: Best-selling models, body types, brands
-    - 🏪 **Dealership Insights**: Performance by location, state, region
-    - 👥 **Customer Analytics**: Registration trends, demographics
-    - 💰 **Marketing ROI**: Campaign performance, budget analysis
-    - 🎯 **Competitive Intelligence**: Market share, competitor analysis
+    def __init__(self, result: dict):
+        super().__init__(result.get("error", "Unknown error"))
+        self.result = result
+
+
+@st.cache_resource(show_spinner=False)
+def _query_generations() -> dict:
+    """Per-question generation counters shared by all sessions; bumped by fresh queries"""
+    return {}
+
+
+@st.cache_data(ttl=config.QUERY_CACHE_TTL_SECONDS, max_entries=128, show_spinner=False)
+def _cached_query(
+    normalized_question: str,
+    schema_key: int,
+    generation: int,
+    _question: str,
+    _use_cache: bool = True,
+) -> dict:
+    """Agent answer keyed by normalized question, schema and generation (_ args are not hashed)"""
+    result = query_database(_question, use_cache=_use_cache)
+    if result["status"] != "success" or result.get("stopped"):
+        raise _QueryFailed(result)
+    return result
+
+
+def answer_question(question: str) -> dict:
+    """Answer a question, reusing a cached answer unless a fresh query was requested"""
+    normalized_question = _normalize_question(question)
+    generations = _query_generations()
     
-    ### How to use:
-    1. Type your question in natural language
-    2. I'll convert it to SQL and query the database
-    3. Get instant insights with explanations
+    # A fresh query moves the question to a new cache entry, so later
+    # non-fresh asks see the fresh answer instead of the stale one
+    fresh = bool(st.session_state.get("fresh_query"))
+    if fresh:
+        generations[normalized_question] = generations.get(normalized_question, 0) + 1
     
-    **Try asking a question from the sidebar, or type your own!**
-    """)
+    schema_key = hash(_cached_schema()[1])
+    try:
+        return _cached_query(
+            normalized_question,
+            schema_key,
+            generations.get(normalized_question, 0),
+            question,
+            _use_cache=not fresh,
+        )
+    except _QueryFailed as e:
+        return e.result
+
+
+def display_welcome_message():
+    """Display welcome message when chat is empty"""
+    st.markdown(_WELCOME_MARKDOWN)
     
     # Display database schema
     with st.expander("📚 View Database Schema"):
         try:
-            db_instance = get_database_instance()
-            tables = db_instance.get_table_names()
+            tables, schema_info = _cached_schema()
             
             st.write("**Available Tables:**")
             for table in tables:
@@ -220,7 +337,6 @@ def display_welcome_message():
             
             st.markdown("---")
             st.write("**Detailed Schema:**")
-            schema_info = db_instance.get_table_info()
             st.code(schema_info, language="sql")
             
         except Exception as e:
@@ -230,11 +346,9 @@ def display_welcome_message():
 def process_user_query(question: str):
     """Process user query and display results"""
     # Add user message
-    st.session_state.messages.append({
-        "role": "user",
-        "content": question,
-        "timestamp": datetime.now()
-    })
+    st.session_state.messages.append(
+        ChatMessage(role="user", content=question, ts=time.time())
+    )
     
     # Display user message
     with st.chat_message("user"):
@@ -244,7 +358,7 @@ def process_user_query(question: str):
     with st.chat_message("assistant"):
         with st.spinner("Analyzing your question and querying database..."):
             try:
-                result = query_database(question)
+                result = answer_question(question)
                 
                 if result["status"] == "success":
                     # Display answer
@@ -257,49 +371,60 @@ def process_user_query(question: str):
                                 st.code(query, language="sql")
                     
                     # Add to message history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": result["answer"],
-                        "timestamp": datetime.now(),
-                        "sql_queries": result.get("sql_queries", []),
-                        "steps_count": result.get("steps_count", 0)
-                    })
+                    st.session_state.messages.append(ChatMessage(
+                        role="assistant",
+                        content=result["answer"],
+                        ts=time.time(),
+                        sql_queries=tuple(result.get("sql_queries", ())),
+                        steps_count=result.get("steps_count", 0),
+                    ))
                     
                 else:
                     error_msg = f"I encountered an error: {result.get('error', 'Unknown error')}"
                     st.error(error_msg)
                     
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg,
-                        "timestamp": datetime.now(),
-                        "error": True
-                    })
+                    st.session_state.messages.append(ChatMessage(
+                        role="assistant",
+                        content=error_msg,
+                        ts=time.time(),
+                        error=True,
+                    ))
                 
             except Exception as e:
                 error_msg = f"An unexpected error occurred: {str(e)}"
                 st.error(error_msg)
                 logger.error(f"Query processing error: {str(e)}")
                 
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": error_msg,
-                    "timestamp": datetime.now(),
-                    "error": True
-                })
+                st.session_state.messages.append(ChatMessage(
+                    role="assistant",
+                    content=error_msg,
+                    ts=time.time(),
+                    error=True,
+                ))
 
 
 def display_chat_history():
     """Display chat message history"""
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.write(message["content"])
+    messages = st.session_state.messages
+    
+    # Only render the most recent messages unless the user asks for the rest
+    hidden_count = len(messages) - _HISTORY_WINDOW
+    if hidden_count > 0 and not st.session_state.show_all_history:
+        if st.button(f"⬆️ Show {hidden_count} earlier messages"):
+            st.session_state.show_all_history = True
+            st.rerun()
+        messages = messages[-_HISTORY_WINDOW:]
+    
+    for message in messages:
+        with st.chat_message(message.role):
+            st.write(message.content)
             
             # Display SQL queries for assistant messages
-            if message["role"] == "assistant" and "sql_queries" in message:
-                if message["sql_queries"]:
+            if message.role == "assistant":
+                if message.sql_queries:
                     with st.expander("🔍 View SQL Queries"):
-                        for i, query in enumerate(message["sql_queries"], 1):
+                        # Agent retries often repeat a query; show each distinct one once
+                        for query in dict.fromkeys(message.sql_queries):
                             st.code(query, language="sql")
 
 
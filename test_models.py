@@ -1,7 +1,4 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel
-
-vertexai.init(project="sql-ai-474116", location="us-central1")
+from concurrent.futures import ThreadPoolExecutor
 
 models = [
     "gemini-1.5-flash",
@@ -11,10 +8,34 @@ models = [
     "gemini-pro"
 ]
 
-for model_name in models:
+
+def probe(model_name):
+    from vertexai.generative_models import GenerativeModel
+    
     try:
         model = GenerativeModel(model_name)
-        response = model.generate_content("test")
-        print(f"✅ {model_name} - AVAILABLE")
+        model.generate_content("test")
+        return model_name, True, None
     except Exception as e:
-        print(f"❌ {model_name} - {str(e)[:80]}")
+        return model_name, False, str(e)[:80]
+
+
+def main():
+    # Vertex AI SDK is imported here so importing this module stays cheap
+    import vertexai
+    
+    vertexai.init(project="sql-ai-474116", location="us-central1")
+    
+    # Probes are independent network round trips, so run them all at once
+    with ThreadPoolExecutor(max_workers=len(models)) as executor:
+        results = list(executor.map(probe, models))
+    
+    for model_name, ok, error in results:
+        if ok:
+            print(f"✅ {model_name} - AVAILABLE")
+        else:
+            print(f"❌ {model_name} - {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,100 +3,208 @@ Test Suite for Automotive Sales Analytics Chatbot
 Run this script to validate all components before deployment
 """
 
+import argparse
+import importlib.util
+import io
 import sys
 import os
 import logging
-from typing import Dict, List, Tuple
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+import mmap
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+from typing import Callable, Dict, List, Optional, Tuple
+
+# No handler is installed here: results are printed directly, and
+# warnings from the app modules still reach stderr via logging's fallback
 logger = logging.getLogger(__name__)
 
-# Add app to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+# Report missing configuration per field instead of failing on import
+os.environ.setdefault("SKIP_CONFIG_VALIDATE", "1")
+
+# Directory containing the app package; only put on sys.path while app modules import
+_APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+_app_import_lock = threading.Lock()
+
+# Test results, stored column-wise: pass/fail flags (1/0), names and messages
+_flags = bytearray()
+_names: List[str] = []
+_msgs: List[str] = []
+
+# One group's result columns
+Results = Tuple[bytearray, List[str], List[str]]
+
+# Config attributes and environment variables that must be set
+_REQUIRED_CONFIG = ("PROJECT_ID", "BIGQUERY_DATASET", "GEMINI_MODEL")
+_ENV_VARS = ("GCP_PROJECT_ID", "BIGQUERY_DATASET", "GEMINI_MODEL")
+_get_required_config = operator.attrgetter(*_REQUIRED_CONFIG)
+
+# Report separators, built once
+_BAR = "=" * 60
+_HDR_TMPL = f"\n{_BAR}\n  {{}}\n{_BAR}\n\n"
+_FOOTER_TMPL = f"\n{_BAR}\n{{}}\n{_BAR}\n\n"
+
+# Per-thread output buffer and results while a test group runs in the pool
+_local = threading.local()
+
 
-# Test results
-test_results: List[Tuple[str, bool, str]] = []
+def _results() -> Results:
+    """Result columns for the current test group"""
+    return getattr(_local, "results", (_flags, _names, _msgs))
+
+
+def _out():
+    """Output stream for the current test group"""
+    return getattr(_local, "buffer", sys.stdout)
 
 
 def print_header(text: str):
     """Print formatted header"""
-    print("\n" + "="*60)
-    print(f"  {text}")
-    print("="*60 + "\n")
+    _out().write(_HDR_TMPL.format(text))
 
 
 def print_result(test_name: str, passed: bool, message: str = ""):
     """Print test result"""
+    out = _out()
     status = "✅ PASS" if passed else "❌ FAIL"
-    print(f"{status} - {test_name}")
+    print(f"{status} - {test_name}", file=out)
     if message:
-        print(f"    {message}")
-    test_results.append((test_name, passed, message))
+        print(f"    {message}", file=out)
+    flags, names, msgs = _results()
+    flags.append(1 if passed else 0)
+    names.append(test_name)
+    msgs.append(message)
+
+
+def run_test(test) -> Tuple[str, Results]:
+    """
+    Run a test group with its output and results captured
+    
+    Returns:
+        Tuple: Captured output and the group's results
+    """
+    _local.buffer = io.StringIO()
+    _local.results = (bytearray(), [], [])
+    try:
+        test()
+        return _local.buffer.getvalue(), _local.results
+    finally:
+        del _local.buffer, _local.results
+
+
+def _record(output: str, results: Results) -> None:
+    """Write a finished test group's output and add its results to the suite totals"""
+    sys.stdout.write(output)
+    flags, names, msgs = results
+    _flags.extend(flags)
+    _names.extend(names)
+    _msgs.extend(msgs)
+
+
+@contextmanager
+def _app_on_path():
+    """Make the app package importable for the duration of the block"""
+    # App imports are serialized: when a module fails to load, threads importing
+    # it concurrently report misleading partial-initialization errors instead
+    with _app_import_lock:
+        # Running the script from the repo already puts the root on sys.path
+        inserted = _APP_ROOT not in sys.path
+        if inserted:
+            sys.path.insert(0, _APP_ROOT)
+        try:
+            yield
+        finally:
+            if inserted:
+                sys.path.remove(_APP_ROOT)
 
 
+def _scan_root(names) -> Dict[str, "os.DirEntry"]:
+    """Directory entries for the given file names, from a single pass over the current directory"""
+    wanted = set(names)
+    with os.scandir('.') as it:
+        return {entry.name: entry for entry in it if entry.name in wanted}
+
+
+# Test groups in run (definition) order; heavy SDKs are only imported by the groups that use them
+_TESTS: List[Callable[[], None]] = []
+
+
+def register(test: Callable[[], None]) -> Callable[[], None]:
+    """Add a test group to the suite"""
+    _TESTS.append(test)
+    return test
+
+
+@lru_cache(maxsize=None)
+def _probe(module_name: str) -> bool:
+    """Whether a module is installed, resolved by its finder without executing it"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+@register
 def test_imports():
     """Test if all required modules can be imported"""
     print_header("Testing Module Imports")
     
     try:
-        import streamlit
-        print_result("Streamlit import", True, f"Version {streamlit.__version__}")
-    except Exception as e:
-        print_result("Streamlit import", False, str(e))
+        print_result("Streamlit import", True, f"Version {version('streamlit')}")
+    except PackageNotFoundError:
+        print_result("Streamlit import", False, "Not installed")
     
-    try:
-        import google.cloud.bigquery
+    if _probe("google.cloud.bigquery"):
         print_result("BigQuery import", True)
-    except Exception as e:
-        print_result("BigQuery import", False, str(e))
+    else:
+        print_result("BigQuery import", False, "Not installed")
     
-    try:
-        import vertexai
+    if _probe("vertexai"):
         print_result("Vertex AI import", True)
-    except Exception as e:
-        print_result("Vertex AI import", False, str(e))
+    else:
+        print_result("Vertex AI import", False, "Not installed")
     
     try:
-        import langchain
-        print_result("LangChain import", True, f"Version {langchain.__version__}")
-    except Exception as e:
-        print_result("LangChain import", False, str(e))
+        print_result("LangChain import", True, f"Version {version('langchain')}")
+    except PackageNotFoundError:
+        print_result("LangChain import", False, "Not installed")
     
-    try:
-        from langchain_google_vertexai import ChatVertexAI
+    if _probe("langchain_google_vertexai"):
         print_result("LangChain Vertex AI import", True)
-    except Exception as e:
-        print_result("LangChain Vertex AI import", False, str(e))
+    else:
+        print_result("LangChain Vertex AI import", False, "Not installed")
     
-    try:
-        from langchain_community.utilities import SQLDatabase
+    if _probe("langchain_community.utilities"):
         print_result("LangChain SQL utilities import", True)
-    except Exception as e:
-        print_result("LangChain SQL utilities import", False, str(e))
+    else:
+        print_result("LangChain SQL utilities import", False, "Not installed")
 
 
+@register
 def test_configuration():
     """Test configuration loading"""
     print_header("Testing Configuration")
     
     try:
-        from app.config import config
+        with _app_on_path():
+            from app.config import config
         print_result("Configuration import", True)
         
-        # Check required fields
-        required_fields = ['PROJECT_ID', 'BIGQUERY_DATASET', 'GEMINI_MODEL']
+        # Check required fields, read in one call
+        try:
+            values = _get_required_config(config)
+        except AttributeError:
+            values = tuple(getattr(config, field, None) for field in _REQUIRED_CONFIG)
         all_set = True
-        for field in required_fields:
-            value = getattr(config, field, None)
-            if not value or value.startswith('YOUR_'):
+        for field, value in zip(_REQUIRED_CONFIG, values):
+            if value and not value.startswith('YOUR_'):
+                print_result(f"Config: {field}", True, f"Set to: {value}")
+            else:
                 all_set = False
                 print_result(f"Config: {field}", False, "Not configured")
-            else:
-                print_result(f"Config: {field}", True, f"Set to: {value}")
         
         if all_set:
             print_result("All required config fields", True)
@@ -107,12 +215,45 @@ def test_configuration():
         print_result("Configuration test", False, str(e))
 
 
+@register
+def test_environment():
+    """Test environment setup"""
+    print_header("Testing Environment")
+    
+    # Check Python version
+    py_version = sys.version_info
+    if py_version >= (3, 11):
+        print_result("Python version", True, f"{py_version.major}.{py_version.minor}.{py_version.micro}")
+    else:
+        print_result("Python version", False, f"Need 3.11+, got {py_version.major}.{py_version.minor}")
+    
+    # Check environment variables
+    for var in _ENV_VARS:
+        value = os.getenv(var)
+        if value:
+            print_result(f"Environment: {var}", True, f"Set")
+        else:
+            print_result(f"Environment: {var}", False, "Not set")
+    
+    # Check credentials
+    creds = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+    if creds:
+        if os.path.exists(creds):
+            print_result("Google credentials file", True, f"Found at {creds}")
+        else:
+            print_result("Google credentials file", False, f"Path set but file not found: {creds}")
+    else:
+        print_result("Google credentials", False, "GOOGLE_APPLICATION_CREDENTIALS not set")
+
+
+@register
 def test_database_module():
     """Test database module"""
     print_header("Testing Database Module")
     
     try:
-        from app.database import BigQueryDatabase, get_database_instance
+        with _app_on_path():
+            from app.database import BigQueryDatabase, get_database_instance
         print_result("Database module import", True)
         
         # Try to get instance (won't connect without credentials)
@@ -126,12 +267,14 @@ def test_database_module():
         print_result("Database module test", False, str(e))
 
 
+@register
 def test_llm_module():
     """Test LLM module"""
     print_header("Testing LLM Module")
     
     try:
-        from app.llm import LLMManager, get_llm_instance
+        with _app_on_path():
+            from app.llm import LLMManager, get_llm_instance
         print_result("LLM module import", True)
         
         try:
@@ -144,12 +287,14 @@ def test_llm_module():
         print_result("LLM module test", False, str(e))
 
 
+@register
 def test_agent_module():
     """Test agent module"""
     print_header("Testing Agent Module")
     
     try:
-        from app.agent import SQLAgentManager, get_agent_instance
+        with _app_on_path():
+            from app.agent import SQLAgentManager, get_agent_instance
         print_result("Agent module import", True)
         
         try:
@@ -162,94 +307,74 @@ def test_agent_module():
         print_result("Agent module test", False, str(e))
 
 
+@register
 def test_main_application():
     """Test main application module"""
     print_header("Testing Main Application")
     
     try:
-        # Import without running
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("main", "app/main.py")
-        if spec and spec.loader:
+        # Check the file parses without importing or running it
+        if os.path.isfile('app/main.py'):
+            with open('app/main.py', 'rb') as f:
+                compile(f.read(), 'app/main.py', 'exec')
             print_result("Main application module loadable", True)
         else:
             print_result("Main application module loadable", False)
+    except SyntaxError as e:
+        print_result("Main application module loadable", False, str(e))
     except Exception as e:
         print_result("Main application test", False, str(e))
 
 
-def test_environment():
-    """Test environment setup"""
-    print_header("Testing Environment")
-    
-    # Check Python version
-    import sys
-    version = sys.version_info
-    if version.major == 3 and version.minor >= 11:
-        print_result("Python version", True, f"{version.major}.{version.minor}.{version.micro}")
-    else:
-        print_result("Python version", False, f"Need 3.11+, got {version.major}.{version.minor}")
-    
-    # Check environment variables
-    env_vars = [
-        'GCP_PROJECT_ID',
-        'BIGQUERY_DATASET',
-        'GEMINI_MODEL'
-    ]
-    
-    for var in env_vars:
-        value = os.getenv(var)
-        if value:
-            print_result(f"Environment: {var}", True, f"Set")
-        else:
-            print_result(f"Environment: {var}", False, "Not set")
-    
-    # Check credentials
-    creds = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-    if creds:
-        if os.path.exists(creds):
-            print_result("Google credentials file", True, f"Found at {creds}")
-        else:
-            print_result("Google credentials file", False, f"Path set but file not found: {creds}")
-    else:
-        print_result("Google credentials", False, "GOOGLE_APPLICATION_CREDENTIALS not set")
-
-
+@register
 def test_docker_setup():
     """Test Docker configuration"""
     print_header("Testing Docker Configuration")
     
+    entries = _scan_root(('Dockerfile', '.dockerignore', 'requirements.txt'))
+    
     # Check Dockerfile exists
-    if os.path.exists('Dockerfile'):
+    if 'Dockerfile' in entries:
         print_result("Dockerfile exists", True)
         
         # Check Dockerfile contents
-        with open('Dockerfile', 'r') as f:
-            content = f.read()
-            if 'FROM python:3.11' in content:
-                print_result("Dockerfile base image", True, "Python 3.11")
-            else:
-                print_result("Dockerfile base image", False, "Wrong Python version")
+        # Search the mapped file in place; mmap rejects empty files
+        found = False
+        if entries['Dockerfile'].stat().st_size:
+            with open('Dockerfile', 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                found = mm.find(b'FROM python:3.11') != -1
+        if found:
+            print_result("Dockerfile base image", True, "Python 3.11")
+        else:
+            print_result("Dockerfile base image", False, "Wrong Python version")
     else:
         print_result("Dockerfile exists", False)
     
     # Check .dockerignore exists
-    if os.path.exists('.dockerignore'):
+    if '.dockerignore' in entries:
         print_result(".dockerignore exists", True)
     else:
         print_result(".dockerignore exists", False)
     
     # Check requirements.txt exists
-    if os.path.exists('requirements.txt'):
+    if 'requirements.txt' in entries:
         print_result("requirements.txt exists", True)
         
-        with open('requirements.txt', 'r') as f:
-            lines = f.readlines()
-            print_result("Dependencies count", True, f"{len(lines)} packages")
+        # Count lines on raw bytes instead of materializing each line as a str
+        line_count = 0
+        last_chunk = b''
+        with open('requirements.txt', 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                line_count += chunk.count(b'\n')
+                last_chunk = chunk
+        if last_chunk and not last_chunk.endswith(b'\n'):
+            line_count += 1
+        print_result("Dependencies count", True, f"{line_count} packages")
     else:
         print_result("requirements.txt exists", False)
 
 
+@register
 def test_documentation():
     """Test documentation completeness"""
     print_header("Testing Documentation")
@@ -263,80 +388,142 @@ def test_documentation():
         'env-vars.yaml'
     ]
     
+    entries = _scan_root(docs)
     for doc in docs:
-        if os.path.exists(doc):
-            size = os.path.getsize(doc)
+        if doc in entries:
+            size = entries[doc].stat().st_size
             print_result(f"Documentation: {doc}", True, f"{size} bytes")
         else:
             print_result(f"Documentation: {doc}", False, "Not found")
 
 
+@register
 def test_deployment_script():
     """Test deployment script"""
     print_header("Testing Deployment Script")
     
-    if os.path.exists('deploy.sh'):
-        print_result("deploy.sh exists", True)
-        
-        # Check if executable
-        import stat
-        st = os.stat('deploy.sh')
-        if st.st_mode & stat.S_IXUSR:
-            print_result("deploy.sh is executable", True)
-        else:
-            print_result("deploy.sh is executable", False, "Run: chmod +x deploy.sh")
-    else:
+    # An executable file necessarily exists, so the existence probe is only
+    # needed when the access check fails
+    executable = os.access('deploy.sh', os.X_OK)
+    if not executable and not os.path.exists('deploy.sh'):
         print_result("deploy.sh exists", False)
+        return
+    
+    print_result("deploy.sh exists", True)
+    
+    # Check if executable
+    if executable:
+        print_result("deploy.sh is executable", True)
+    else:
+        print_result("deploy.sh is executable", False, "Run: chmod +x deploy.sh")
 
 
 def print_summary():
     """Print test summary"""
-    print_header("Test Summary")
-    
-    total = len(test_results)
-    passed = sum(1 for _, p, _ in test_results if p)
+    total = len(_flags)
+    passed = _flags.count(1)
     failed = total - passed
     
-    print(f"Total tests: {total}")
-    print(f"Passed: {passed} ✅")
-    print(f"Failed: {failed} ❌")
-    print(f"Success rate: {(passed/total*100):.1f}%\n")
+    # Build the whole summary and write it once
+    lines = [
+        f"Total tests: {total}",
+        f"Passed: {passed} ✅",
+        f"Failed: {failed} ❌",
+        f"Success rate: {(passed/total*100 if total else 0.0):.1f}%",
+        "",
+    ]
     
     if failed > 0:
-        print("\nFailed tests:")
-        for name, passed, message in test_results:
-            if not passed:
-                print(f"  ❌ {name}")
-                if message:
-                    print(f"     {message}")
-    
-    print("\n" + "="*60)
+        lines += ["", "Failed tests:"]
+        for i in (i for i, flag in enumerate(_flags) if not flag):
+            lines.append(f"  ❌ {_names[i]}")
+            if _msgs[i]:
+                lines.append(f"     {_msgs[i]}")
+    
     if failed == 0:
-        print("🎉 All tests passed! Ready for deployment.")
+        footer = _FOOTER_TMPL.format("🎉 All tests passed! Ready for deployment.")
     else:
-        print("⚠️  Some tests failed. Please fix before deployment.")
-    print("="*60 + "\n")
+        footer = _FOOTER_TMPL.format("⚠️  Some tests failed. Please fix before deployment.")
+    
+    _out().write(_HDR_TMPL.format("Test Summary") + "\n".join(lines) + "\n" + footer)
     
     return failed == 0
 
 
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Validate components before deployment")
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="NAME",
+        help="Run only this test group, e.g. 'imports' or 'docker_setup' (repeatable)",
+    )
+    parser.add_argument(
+        "--skip",
+        action="append",
+        metavar="NAME",
+        help="Skip this test group (repeatable)",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action=argparse.BooleanOptionalAction,
+        default=bool(os.getenv("CI")),
+        help="Stop after the import checks if any package is missing (default on when CI is set)",
+    )
+    return parser.parse_args(argv)
+
+
+def _group_name(test: Callable[[], None]) -> str:
+    """Command line name of a test group, e.g. 'docker_setup'"""
+    return test.__name__[len("test_"):]
+
+
+def _resolve_names(names: List[str]) -> List[str]:
+    """Normalize --only/--skip names, rejecting unknown groups"""
+    available = [_group_name(test) for test in _TESTS]
+    resolved = [name[len("test_"):] if name.startswith("test_") else name for name in names]
+    unknown = [name for name in resolved if name not in available]
+    if unknown:
+        raise SystemExit(
+            f"Unknown test group(s): {', '.join(unknown)}. "
+            f"Available: {', '.join(available)}"
+        )
+    return resolved
+
+
+def select_tests(only: Optional[List[str]] = None, skip: Optional[List[str]] = None) -> list:
+    """Return the registered test functions to run, filtered by --only and --skip names"""
+    tests = _TESTS
+    if only:
+        names = _resolve_names(only)
+        tests = [test for test in tests if _group_name(test) in names]
+    if skip:
+        names = _resolve_names(skip)
+        tests = [test for test in tests if _group_name(test) not in names]
+    return tests
+
+
 def main():
     """Run all tests"""
-    print("\n" + "="*60)
-    print("  Automotive Sales Analytics Chatbot - Test Suite")
-    print("="*60)
-    
-    # Run all tests
-    test_imports()
-    test_configuration()
-    test_environment()
-    test_database_module()
-    test_llm_module()
-    test_agent_module()
-    test_main_application()
-    test_docker_setup()
-    test_documentation()
-    test_deployment_script()
+    args = parse_args()
+    tests = select_tests(args.only, args.skip)
+    
+    sys.stdout.write(f"\n{_BAR}\n  Automotive Sales Analytics Chatbot - Test Suite\n{_BAR}\n")
+    
+    # With missing packages every later group fails the same way, so check imports first
+    if args.fail_fast and test_imports in tests:
+        tests = [test for test in tests if test is not test_imports]
+        _record(*run_test(test_imports))
+        if 0 in _flags:
+            print_summary()
+            sys.exit(1)
+    
+    # Test groups are dominated by import and filesystem I/O, so overlap them.
+    # Output and results are replayed in run order to keep the report stable
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for output, results in executor.map(run_test, tests):
+            _record(output, results)
     
     # Print summary
     all_passed = print_summary()